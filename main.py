@@ -9,18 +9,17 @@ from __future__ import annotations
 import asyncio
 import logging
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
+from src.analyzer import find_missing_coverage, generate_coverage_report, load_coverage_data
+from src.enricher import API_LOG_PATH, LOG_FORMAT, api_log, enrich_all_ads
+from src.parser import ads_to_df, parse_html_files
 
-from src.analyzer import find_missing_coverage, generate_coverage_report
-from src.enricher import enrich_all_ads
-from src.parser import parse_html_files
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 # File paths
@@ -33,6 +32,21 @@ ADS_RAW_CSV = DATA_DIR / "ads_raw.csv"
 ADS_ENRICHED_CSV = DATA_DIR / "ads_enriched.csv"
 MISSING_COVERAGE_CSV = DATA_DIR / "missing_coverage.csv"
 
+# Write buffer for CSV output; pandas writes row by row through the file handle
+CSV_WRITE_BUFFER = 1 << 20
+
+
+def save_csv(df: pd.DataFrame, path: Path) -> None:
+    """
+    Save a DataFrame to CSV through a large write buffer.
+
+    Args:
+        df: DataFrame to save.
+        path: Destination CSV path.
+    """
+    with path.open("w", encoding="utf-8", newline="", buffering=CSV_WRITE_BUFFER) as f:
+        df.to_csv(f, index=False)
+
 
 def step1_parse_html() -> pd.DataFrame:
     """
@@ -47,68 +61,85 @@ def step1_parse_html() -> pd.DataFrame:
     logger.info(f"Found {len(ads)} ads across {len(HTML_FILES)} files")
 
     # Convert to DataFrame and save
-    df = pd.DataFrame([ad.to_dict() for ad in ads])
-    df.to_csv(ADS_RAW_CSV, index=False)
+    df = ads_to_df(ads)
+    save_csv(df, ADS_RAW_CSV)
     logger.info(f"Saved raw ads to {ADS_RAW_CSV}")
 
     return df
 
 
-async def step2_enrich_ads(ads_df: pd.DataFrame) -> pd.DataFrame:
+async def step2_enrich_ads(ads_df: pd.DataFrame) -> int:
     """
     Step 2: Enrich ads via API.
 
+    Enriched ads are appended to the CSV batch by batch as the API responds,
+    so the full enriched dataset is never held in memory.
+
     Args:
         ads_df: DataFrame with parsed ads.
 
     Returns:
-        DataFrame with enriched ads.
+        Number of enriched ads written to the CSV.
     """
     logger.info("=== Step 2: Enriching ads via API ===")
 
-    # Convert to list of dicts for API processing
-    ads_list = ads_df.to_dict("records")
-
-    # Enrich via API
-    enriched_ads, _stats = await enrich_all_ads(
-        ads_list,
-        batch_size=200,
-        rate_limit_delay=0.5,
-    )
-
-    # Convert to DataFrame and save
-    df = pd.DataFrame(enriched_ads)
-    df.to_csv(ADS_ENRICHED_CSV, index=False)
-    logger.info(f"Saved enriched ads to {ADS_ENRICHED_CSV}")
-
-    return df
-
-
-def step3_analyze_coverage(enriched_df: pd.DataFrame) -> pd.DataFrame:
+    with ADS_ENRICHED_CSV.open("w", encoding="utf-8", newline="", buffering=CSV_WRITE_BUFFER) as f:
+        columns: pd.Index | None = None
+        dropped_columns: set[str] = set()
+        rows_written = 0
+
+        def write_batch(batch_df: pd.DataFrame) -> None:
+            nonlocal columns, rows_written
+            if batch_df.empty:
+                return
+            rows_written += len(batch_df)
+            # Columns are taken from the first enriched batch
+            if columns is None:
+                columns = batch_df.columns
+                batch_df.to_csv(f, index=False)
+                return
+            # The header is already written, so later columns cannot be added
+            if new := set(batch_df.columns.difference(columns)) - dropped_columns:
+                dropped_columns.update(new)
+                logger.warning(f"Dropping columns missing from the CSV header: {sorted(new)}")
+            batch_df.reindex(columns=columns).to_csv(f, index=False, header=False)
+
+        # Enrich via API
+        await enrich_all_ads(
+            ads_df,
+            batch_size=200,
+            rate_limit_delay=0.5,
+            on_batch=write_batch,
+        )
+
+    logger.info(f"Saved {rows_written} enriched ads to {ADS_ENRICHED_CSV}")
+
+    return rows_written
+
+
+def step3_analyze_coverage() -> pd.DataFrame:
     """
     Step 3: Analyze coverage and find missing combinations.
 
-    Args:
-        enriched_df: DataFrame with enriched ads.
-
     Returns:
         DataFrame with missing combinations.
     """
     logger.info("=== Step 3: Analyzing coverage ===")
 
-    # Find missing combinations
+    # Load and normalize each input once, shared by both analyses
+    enriched_df = load_coverage_data(ADS_ENRICHED_CSV)
+    output_df = load_coverage_data(OUTPUT_CSV)
+
+    # Find missing combinations and save them
     missing_df = find_missing_coverage(
-        ADS_ENRICHED_CSV,
-        OUTPUT_CSV,
+        enriched_df,
+        output_df,
         MISSING_COVERAGE_CSV,
     )
-
-    # Save missing coverage
-    missing_df.to_csv(MISSING_COVERAGE_CSV, index=False)
     logger.info(f"Saved missing coverage to {MISSING_COVERAGE_CSV}")
 
     # Generate and log coverage report
-    report = generate_coverage_report(ADS_ENRICHED_CSV, OUTPUT_CSV)
+    report = generate_coverage_report(enriched_df, output_df)
     logger.info("=== Coverage Report ===")
     logger.info(f"Total combinations: {report['total_combinations']}")
     logger.info(f"Covered combinations: {report['covered_combinations']}")
@@ -122,31 +153,35 @@ async def run_pipeline() -> None:
     """
     Run the complete pipeline.
     """
-    logger.info("Starting Avito Ads Parser Pipeline")
-    logger.info("=" * 50)
-
-    # Ensure data directory exists
-    DATA_DIR.mkdir(exist_ok=True)
-
-    # Step 1: Parse HTML
-    ads_df = step1_parse_html()
-    if ads_df.empty:
-        logger.warning("No ads found in HTML files, exiting")
-        return
-
-    # Step 2: Enrich via API
-    enriched_df = await step2_enrich_ads(ads_df)
-
-    # Step 3: Analyze coverage
-    step3_analyze_coverage(enriched_df)
-
-    logger.info("=" * 50)
-    logger.info("Pipeline completed successfully!")
-    logger.info("Output files:")
-    logger.info(f"  - {ADS_RAW_CSV}")
-    logger.info(f"  - {ADS_ENRICHED_CSV}")
-    logger.info(f"  - {MISSING_COVERAGE_CSV}")
-    logger.info("  - logs/api_log.txt")
+    with api_log():
+        logger.info("Starting Avito Ads Parser Pipeline")
+        logger.info("=" * 50)
+
+        # Ensure data directory exists
+        DATA_DIR.mkdir(exist_ok=True)
+
+        # Step 1: Parse HTML
+        ads_df = step1_parse_html()
+        if ads_df.empty:
+            logger.warning("No ads found in HTML files, exiting")
+            return
+
+        # Step 2: Enrich via API
+        # An empty enriched CSV has no header for step 3 to read
+        if await step2_enrich_ads(ads_df) == 0:
+            logger.warning("No ads were enriched, exiting")
+            return
+
+        # Step 3: Analyze coverage
+        step3_analyze_coverage()
+
+        logger.info("=" * 50)
+        logger.info("Pipeline completed successfully!")
+        logger.info("Output files:")
+        logger.info(f"  - {ADS_RAW_CSV}")
+        logger.info(f"  - {ADS_ENRICHED_CSV}")
+        logger.info(f"  - {MISSING_COVERAGE_CSV}")
+        logger.info(f"  - {API_LOG_PATH}")
 
 
 if __name__ == "__main__":
@@ -7,13 +7,15 @@ This package provides tools for:
 - Analyzing coverage against a target catalog
 """
 
-from .analyzer import find_missing_coverage, generate_coverage_report
-from .parser import Ad, parse_html_file, parse_html_files
+from .analyzer import find_missing_coverage, generate_coverage_report, load_coverage_data
+from .parser import Ad, ads_to_df, parse_html_file, parse_html_files
 
 __all__ = [
     "Ad",
+    "ads_to_df",
     "find_missing_coverage",
     "generate_coverage_report",
+    "load_coverage_data",
     "parse_html_file",
     "parse_html_files",
 ]
@@ -13,11 +13,71 @@ import pandas as pd
 if TYPE_CHECKING:
     from pathlib import Path
 
+# Columns that define a product combination
+GROUP_COLS = ["group0", "group1", "group2"]
+
+# Columns read from CSV; anything else in the enriched or catalog files is unused
+COVERAGE_COLS = [*GROUP_COLS, "marka", "model"]
+
+
+def _normalize_groups(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a copy of df with group columns as strings and NaN as ""."""
+    # Casting first lets fillna work on the string column: one copy, not two
+    return df.assign(**df[GROUP_COLS].astype("string").fillna(""))
+
+
+def _combination_keys(
+    output_df: pd.DataFrame,
+    enriched_df: pd.DataFrame,
+) -> tuple[pd.Series, pd.Series]:
+    """
+    Encode each row's group combination as an int64 key shared by both frames.
+
+    Every group column is factorized over both frames together, so equal
+    values get equal codes, and the three codes are packed into one integer
+    (mixed radix). Set operations then hash one integer per row instead of
+    three strings.
+    """
+    n_output = len(output_df)
+    keys = pd.Series(0, index=range(n_output + len(enriched_df)), dtype="int64")
+    for col in GROUP_COLS:
+        values = pd.concat([output_df[col], enriched_df[col]], ignore_index=True)
+        codes, uniques = pd.factorize(values)
+        keys = keys * len(uniques) + codes
+
+    return keys.iloc[:n_output], keys.iloc[n_output:]
+
+
+def load_coverage_data(source: str | Path | pd.DataFrame) -> pd.DataFrame:
+    """
+    Load ads or catalog data with normalized group columns.
+
+    When reading from CSV, only the group columns and ``marka``/``model``
+    are parsed, directly as strings. Empty fields stay "" instead of
+    becoming NaN, so the result needs no further normalization.
+
+    Args:
+        source: Path to a CSV file, or an already loaded DataFrame.
+
+    Returns:
+        DataFrame with group columns as strings and NaN replaced by "".
+        A DataFrame passed in is not modified.
+    """
+    if isinstance(source, pd.DataFrame):
+        return _normalize_groups(source)
+
+    return pd.read_csv(
+        source,
+        usecols=lambda col: col in COVERAGE_COLS,
+        dtype=dict.fromkeys(COVERAGE_COLS, "string"),
+        keep_default_na=False,
+    )
+
 
 def find_missing_coverage(
-    enriched_path: str | Path,
-    output_path: str | Path,
-    output_missing_path: str | Path,
+    enriched: str | Path | pd.DataFrame,
+    output: str | Path | pd.DataFrame,
+    output_missing_path: str | Path | None = None,
 ) -> pd.DataFrame:
     """
     Find missing combinations in the coverage.
@@ -26,58 +86,43 @@ def find_missing_coverage(
     missing group0 + group1 + group2 combinations.
 
     Args:
-        enriched_path: Path to ads_enriched.csv
-        output_path: Path to output.csv (target catalog)
-        output_missing_path: Path to save missing_coverage.csv
+        enriched: Path to ads_enriched.csv, or the enriched ads DataFrame
+        output: Path to output.csv (target catalog), or the catalog DataFrame
+        output_missing_path: Optional path to save missing_coverage.csv
 
     Returns:
         DataFrame with missing combinations.
     """
     # Load data
-    enriched_df = pd.read_csv(enriched_path)
-    output_df = pd.read_csv(output_path)
-
-    # Normalize group columns to string and handle NaN
-    group_cols = ["group0", "group1", "group2"]
-    for col in group_cols:
-        enriched_df[col] = enriched_df[col].fillna("").astype(str)
-        output_df[col] = output_df[col].fillna("").astype(str)
-
-    # Get existing combinations from enriched ads
-    existing_combinations = enriched_df[group_cols].drop_duplicates().reset_index(drop=True)
-
-    # Get target combinations from output catalog
-    target_combinations = output_df[group_cols].drop_duplicates().reset_index(drop=True)
-
-    # Find missing combinations using merge with indicator
-    merged = target_combinations.merge(
-        existing_combinations,
-        on=group_cols,
-        how="left",
-        indicator=True,
-    )
+    enriched_df = load_coverage_data(enriched)
+    output_df = load_coverage_data(output)
 
-    # Filter for left_only (missing in enriched)
-    missing = merged[merged["_merge"] == "left_only"].copy()
+    # Set difference on integer-encoded combinations
+    target_keys, existing_keys = _combination_keys(output_df, enriched_df)
+    is_missing = ~target_keys.isin(existing_keys).to_numpy()
 
-    if len(missing) == 0:
+    if not is_missing.any():
         print("No missing coverage found - all combinations are covered!")
-        return pd.DataFrame(columns=[*group_cols, "reason"])
+        result_df = pd.DataFrame(columns=[*GROUP_COLS, "reason"])
+        if output_missing_path is not None:
+            result_df.to_csv(output_missing_path, index=False)
+        return result_df
 
-    # Enhance with additional info from output catalog
-    missing_with_info = missing.merge(
-        output_df,
-        on=group_cols,
-        how="left",
-    )
+    # Catalog rows of missing combinations, with how often each combination
+    # occurs in the catalog (used for sorting below)
+    frequency = target_keys.map(target_keys.value_counts()).to_numpy()
+    missing_with_info = output_df[is_missing].assign(frequency=frequency[is_missing])
 
     # Select relevant columns - only use columns that exist
     additional_cols = ["marka", "model"]
     available_cols = [
-        col for col in [*group_cols, *additional_cols] if col in missing_with_info.columns
+        col
+        for col in [*GROUP_COLS, *additional_cols, "frequency"]
+        if col in missing_with_info.columns
     ]
-    result_df = missing_with_info[available_cols].copy()
-    result_df = result_df.drop_duplicates()
+    # Single dedup pass; frequency follows the combination, so it does not
+    # split duplicates. drop_duplicates already returns a new frame
+    result_df = missing_with_info[available_cols].drop_duplicates(ignore_index=True)
 
     # Add missing columns with empty values if needed
     for col in additional_cols:
@@ -87,58 +132,44 @@ def find_missing_coverage(
     # Add reason column
     result_df["reason"] = "отсутствует"
 
-    # Reorder columns to have reason at the end
-    result_df = result_df[[*group_cols, "marka", "model", "reason"]]
-
     # Sort by frequency in output catalog (most common first)
-    freq = output_df[group_cols].value_counts().reset_index(name="frequency")
-    result_df = result_df.merge(freq, on=group_cols, how="left")
-    result_df = result_df.sort_values("frequency", ascending=False)
-    result_df = result_df.drop(columns=["frequency"])
+    result_df = result_df.iloc[(-result_df["frequency"].to_numpy()).argsort(kind="stable")]
+
+    # Reorder columns to have reason at the end
+    result_df = result_df[[*GROUP_COLS, "marka", "model", "reason"]]
 
     # Save to CSV
-    result_df.to_csv(output_missing_path, index=False)
+    if output_missing_path is not None:
+        result_df.to_csv(output_missing_path, index=False)
 
     return result_df
 
 
 def generate_coverage_report(
-    enriched_path: str | Path,
-    output_path: str | Path,
+    enriched: str | Path | pd.DataFrame,
+    output: str | Path | pd.DataFrame,
 ) -> dict[str, Any]:
     """
     Generate a coverage report comparing enriched ads to target catalog.
 
     Args:
-        enriched_path: Path to ads_enriched.csv
-        output_path: Path to output.csv (target catalog)
+        enriched: Path to ads_enriched.csv, or the enriched ads DataFrame
+        output: Path to output.csv (target catalog), or the catalog DataFrame
 
     Returns:
         Dictionary with coverage statistics.
     """
-    enriched_df = pd.read_csv(enriched_path)
-    output_df = pd.read_csv(output_path)
-
-    # Normalize group columns
-    group_cols = ["group0", "group1", "group2"]
-    for col in group_cols:
-        enriched_df[col] = enriched_df[col].fillna("").astype(str)
-        output_df[col] = output_df[col].fillna("").astype(str)
+    enriched_df = load_coverage_data(enriched)
+    output_df = load_coverage_data(output)
 
-    # Get unique combinations
-    enriched_combos = enriched_df[group_cols].drop_duplicates()
-    output_combos = output_df[group_cols].drop_duplicates()
+    # Unique combinations, integer-encoded
+    output_keys, enriched_keys = _combination_keys(output_df, enriched_df)
+    output_keys = output_keys.drop_duplicates()
 
-    total_combos = len(output_combos)
+    total_combos = len(output_keys)
 
     # Count how many target combinations are covered by enriched ads
-    merged = output_combos.merge(
-        enriched_combos,
-        on=group_cols,
-        how="inner",
-        indicator=False,
-    )
-    covered_combos = len(merged)
+    covered_combos = int(output_keys.isin(enriched_keys).sum())
     missing_combos = total_combos - covered_combos
 
     # Calculate coverage percentage
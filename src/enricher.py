@@ -7,41 +7,39 @@ Enriches advertisement titles using the top505.ru API.
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
 import os
+import queue
+import time
 from dataclasses import dataclass
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import httpx
+import orjson
+import pandas as pd
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
 # Load environment variables from .env file
 _ = load_dotenv()
 
-# Create logs directory if it doesn't exist
-Path("logs").mkdir(exist_ok=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("logs/api_log.txt"),
-        logging.StreamHandler(),
-    ],
-)
 logger = logging.getLogger(__name__)
 
+# API log file
+API_LOG_PATH = Path("logs/api_log.txt")
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
 # API Configuration
 API_URL = "https://top505.ru/api/item_batch"
+API_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+KEEPALIVE_EXPIRY = 60.0
 API_KEY = os.getenv("TOP505_API_KEY", "")
-if not API_KEY:
-    logger.warning(
-        "TOP505_API_KEY environment variable is not set. "
-        "API calls will fail with 401 Unauthorized."
-    )
 
 # HTTP Status Codes
 HTTP_OK = 200
@@ -49,14 +47,55 @@ HTTP_UNAUTHORIZED = 401
 HTTP_RATE_LIMIT = 429
 HTTP_SERVER_ERROR = 500
 
+# Rate limit headers
+RETRY_AFTER_HEADER = "Retry-After"
+RATE_LIMIT_REMAINING_HEADER = "X-RateLimit-Remaining"
+RATE_LIMIT_LOW_REMAINING = 1
+# Slowing down never goes below this fraction of the configured rate
+RATE_LIMIT_MIN_FACTOR = 1 / 8
+# Low-quota signals within this many seconds of a slowdown are one event
+RATE_LIMIT_WINDOW = 1.0
+
+
+@contextlib.contextmanager
+def api_log(path: Path = API_LOG_PATH) -> Iterator[None]:
+    """
+    Copy all log records to the API log file while the context is active.
 
-@dataclass
+    Records are queued and written by a listener thread, so concurrent
+    batches never block the event loop on disk I/O. Leaving the context
+    detaches the handler, flushes the queue and closes the file.
+
+    Args:
+        path: Log file to append to; its directory is created if needed.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+    listener = QueueListener(log_queue, file_handler)
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        root.removeHandler(handler)
+        listener.stop()
+        # QueueListener.stop() leaves its handlers open
+        file_handler.close()
+
+
+@dataclass(slots=True, kw_only=True)
 class EnrichmentStats:
     """Statistics for API enrichment."""
 
     total_sent: int = 0
     total_success: int = 0
     total_failed: int = 0
+    unmatched_results: int = 0
     rate_limit_hits: int = 0
     timeout_errors: int = 0
     other_errors: int = 0
@@ -87,16 +126,150 @@ class AuthError(APIError):
     pass
 
 
+class RateLimiter:
+    """
+    Token bucket limiting how often requests are sent.
+
+    Tokens refill at ``rate`` per second up to ``capacity``; every request
+    consumes one. A rate of 0 disables limiting. The server can push the
+    limiter back with :meth:`pause` (``Retry-After``) or :meth:`slow_down`
+    (quota nearly exhausted), which affects every task sharing it. A slowed
+    limiter never drops below ``RATE_LIMIT_MIN_FACTOR`` of its configured
+    rate and returns to it via :meth:`restore` once the quota recovers.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.base_rate = rate
+        self.min_rate = rate * RATE_LIMIT_MIN_FACTOR
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._slowed_at = -RATE_LIMIT_WINDOW
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                if self.rate <= 0:
+                    return
+
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Block all requests for the given number of seconds."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def slow_down(self) -> None:
+        """
+        Halve the request rate, down to ``min_rate``.
+
+        Concurrent responses to the same nearly exhausted quota arrive
+        together, so only the first one within ``RATE_LIMIT_WINDOW`` counts.
+        """
+        now = time.monotonic()
+        if now - self._slowed_at < RATE_LIMIT_WINDOW or self.rate <= self.min_rate:
+            return
+        self._slowed_at = now
+        self.rate = max(self.rate / 2, self.min_rate)
+        logger.warning(f"Rate limit quota nearly exhausted, slowing down to {self.rate:g} req/s")
+
+    def restore(self) -> None:
+        """Return to the configured rate after a slowdown."""
+        if self.rate != self.base_rate:
+            self.rate = self.base_rate
+            logger.info(f"Rate limit quota recovered, back to {self.rate:g} req/s")
+
+    def backoff(self, response: httpx.Response, attempt: int) -> float:
+        """
+        Pause after a rate limit response and return how long to wait.
+
+        Honours ``Retry-After`` when present, otherwise backs off
+        exponentially. The pause holds back every task sharing the limiter.
+        """
+        wait_time = _header_float(response, RETRY_AFTER_HEADER)
+        if wait_time is None:
+            wait_time = 2 ** (attempt + 1)  # Exponential backoff
+        self.pause(wait_time)
+        return wait_time
+
+    def observe(self, response: httpx.Response) -> None:
+        """Adjust the rate to the quota the response reports, if any."""
+        remaining = _header_float(response, RATE_LIMIT_REMAINING_HEADER)
+        if remaining is None:
+            return
+        if remaining <= RATE_LIMIT_LOW_REMAINING:
+            self.slow_down()
+        else:
+            self.restore()
+
+
+def _header_float(response: httpx.Response, name: str) -> float | None:
+    """Read a numeric header value, or None if absent or not a number."""
+    value = response.headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
 def _get_today_date() -> str:
     """Get today's date in YYYY-MM-DD format."""
     return datetime.now().strftime("%Y-%m-%d")
 
 
-async def enrich_batch(
+def _build_payload(titles: list[str], day: str) -> bytes:
+    """Serialize the request body for a batch of titles, once for all retries."""
+    return orjson.dumps(
+        {
+            "source": "1c",
+            "data": [{"title": t, "day": day} for t in titles],
+        }
+    )
+
+
+async def _post_batch(
+    client: httpx.AsyncClient,
+    payload: bytes,
+    limiter: RateLimiter,
+) -> httpx.Response:
+    """Send one batch request once the rate limiter allows it."""
+    await limiter.acquire()
+    response = await client.post(
+        API_URL,
+        content=payload,
+        headers={"X-API-Key": API_KEY, "Content-Type": "application/json"},
+    )
+    limiter.observe(response)
+    return response
+
+
+async def enrich_batch(  # noqa: PLR0913
     titles: list[str],
     client: httpx.AsyncClient,
     stats: EnrichmentStats,
     retry: int = 3,
+    limiter: RateLimiter | None = None,
+    *,
+    day: str | None = None,
 ) -> list[dict[str, Any]]:
     """
     Enrich a batch of titles via the API.
@@ -106,32 +279,29 @@ async def enrich_batch(
         client: HTTP client for making requests.
         stats: Statistics object to track results.
         retry: Number of retries on failure.
+        limiter: Rate limiter consulted before every request, retries included.
+            Defaults to no limiting.
+        day: Date sent with every title, in YYYY-MM-DD format. Defaults to today.
 
     Returns:
         List of enriched data dictionaries.
     """
-    payload = {
-        "source": "1c",
-        "data": [{"title": t, "day": _get_today_date()} for t in titles],
-    }
+    payload = _build_payload(titles, day or _get_today_date())
+
+    limiter = limiter or RateLimiter(rate=0)
 
     for attempt in range(retry):
         try:
             stats.total_sent += len(titles)
 
-            response = await client.post(
-                API_URL,
-                json=payload,
-                headers={"X-API-Key": API_KEY},
-                timeout=30.0,
-            )
+            response = await _post_batch(client, payload, limiter)
 
             if response.status_code == HTTP_OK:
                 try:
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     processed = data.get("processed_data", [])
                     stats.total_success += len(processed)
-                    logger.info(f"Successfully enriched {len(processed)}/{len(titles)} items")
+                    logger.debug(f"Successfully enriched {len(processed)}/{len(titles)} items")
                     return processed
                 except Exception as e:
                     logger.error(f"Failed to parse JSON response: {e}")
@@ -145,7 +315,7 @@ async def enrich_batch(
 
             elif response.status_code == HTTP_RATE_LIMIT:
                 stats.rate_limit_hits += 1
-                wait_time = 2 ** (attempt + 1)  # Exponential backoff
+                wait_time = limiter.backoff(response, attempt)
                 logger.warning(f"Rate limit hit, waiting {wait_time}s before retry")
                 await asyncio.sleep(wait_time)
                 stats.retry_count += 1
@@ -185,50 +355,142 @@ async def enrich_batch(
     return []
 
 
+def _index_enrichment(enriched: list[dict[str, Any]], titles: list[str]) -> pd.DataFrame:
+    """
+    Index API results by the title they were produced for.
+
+    The API echoes the original title as ``raw_item`` (falling back to
+    ``title``), so results are matched by key rather than by position.
+    Results for unknown titles and repeated results are dropped, which keeps
+    out-of-order or partial responses from pairing data with the wrong ad.
+    """
+    enrichment = pd.DataFrame(enriched)
+    keys = pd.Series(pd.NA, index=enrichment.index, dtype=object)
+    for column in ("raw_item", "title"):
+        if column in enrichment:
+            keys = keys.fillna(enrichment[column])
+    enrichment.index = pd.Index(keys, name="title")
+    keep = enrichment.index.isin(titles) & ~enrichment.index.duplicated()
+    return enrichment[keep]
+
+
+def _join_enrichment(ads: pd.DataFrame, enrichment: pd.DataFrame) -> pd.DataFrame:
+    """
+    Attach enrichment (indexed by title) to the ads with matching titles.
+
+    Ads without enrichment are dropped. Enriched values replace ad values
+    in shared columns, and the ads' row order is kept.
+    """
+    enrichment = enrichment.drop(columns="title", errors="ignore")
+    base = ads.drop(columns=ads.columns.intersection(enrichment.columns))
+    return base.join(enrichment, on="title", how="inner")
+
+
 async def enrich_all_ads(
-    ads: list[dict[str, Any]],
+    ads: pd.DataFrame,
     batch_size: int = 200,
     rate_limit_delay: float = 0.5,
-) -> tuple[list[dict[str, Any]], EnrichmentStats]:
+    concurrency: int = 16,
+    on_batch: Callable[[pd.DataFrame], None] | None = None,
+) -> tuple[pd.DataFrame, EnrichmentStats]:
     """
     Enrich all ads via the API with rate limiting.
 
+    Requests are paced by a token bucket allowing one request every
+    ``rate_limit_delay`` seconds, but batches do not wait for each other:
+    up to ``concurrency`` requests are in flight at the same time.
+
+    Enrichment depends only on the title, so each distinct title is sent
+    once and its result is shared by every ad with that title.
+
     Args:
-        ads: List of ad dictionaries with 'title' field.
+        ads: DataFrame of ads with a 'title' column.
         batch_size: Number of items per batch (max 200).
-        rate_limit_delay: Delay between batches in seconds.
+        rate_limit_delay: Minimum interval between requests in seconds.
+        concurrency: Maximum number of batches in flight at once.
+        on_batch: Optional callback receiving the enriched ads of each batch
+            as soon as it completes. When given, enriched ads are handed off
+            instead of collected, and the returned DataFrame is empty. Ads
+            within a batch keep their original order; batches arrive in
+            completion order.
 
     Returns:
-        Tuple of (enriched ads list, statistics).
+        Tuple of (enriched ads DataFrame in the original order, statistics).
+
+    Raises:
+        AuthError: If the API rejects the key. Remaining batches are cancelled,
+            and errors raised by other batches meanwhile are logged.
+        ExceptionGroup: If batches fail for other reasons, e.g. ``on_batch``
+            raising. Remaining batches are cancelled.
     """
+    if not API_KEY:
+        logger.warning(
+            "TOP505_API_KEY environment variable is not set. "
+            "API calls will fail with 401 Unauthorized."
+        )
+
+    # Every batch of the run sends the same date, even if it crosses midnight
+    day = _get_today_date()
     stats = EnrichmentStats()
-    results = []
-
-    async with httpx.AsyncClient() as client:
-        for i in range(0, len(ads), batch_size):
-            batch = ads[i : i + batch_size]
-            titles = [a["title"] for a in batch]
-
-            total_batches = (len(ads) + batch_size - 1) // batch_size
-            current_batch = i // batch_size + 1
-            logger.info(f"Processing batch {current_batch}/{total_batches}")
-
-            enriched = await enrich_batch(titles, client, stats)
-
-            # Merge original ad data with enriched data
-            for j, enriched_item in enumerate(enriched):
-                merged = {**batch[j], **enriched_item}
-                results.append(merged)
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(1 / rate_limit_delay if rate_limit_delay > 0 else 0)
+    title_positions = ads.groupby("title", sort=False).indices
+    unique_titles = list(title_positions)
+    batches = [unique_titles[i : i + batch_size] for i in range(0, len(unique_titles), batch_size)]
+    enrichments: list[pd.DataFrame] = []
+
+    async def _run(index: int, titles: list[str]) -> None:
+        async with semaphore:
+            logger.debug(f"Processing batch {index + 1}/{len(batches)}")
+            enriched = await enrich_batch(titles, client, stats, limiter=limiter, day=day)
+
+        enrichment = _index_enrichment(enriched, titles)
+        if dropped := len(enriched) - len(enrichment):
+            # enrich_batch counted every returned result as a success
+            stats.total_success -= dropped
+            stats.unmatched_results += dropped
+            logger.warning(
+                f"Dropped {dropped}/{len(enriched)} results of batch {index + 1}: "
+                "unknown or repeated titles"
+            )
+        if on_batch is None:
+            enrichments.append(enrichment)
+        else:
+            positions = sorted(i for title in enrichment.index for i in title_positions[title])
+            on_batch(_join_enrichment(ads.iloc[positions], enrichment))
+
+    # HTTP/2 multiplexes concurrent batches over one persistent TLS connection
+    limits = httpx.Limits(
+        max_connections=concurrency,
+        max_keepalive_connections=concurrency,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    # A failed batch (e.g. AuthError) cancels the batches still pending or in flight
+    try:
+        async with (
+            httpx.AsyncClient(http2=True, limits=limits, timeout=API_TIMEOUT) as client,
+            asyncio.TaskGroup() as group,
+        ):
+            for index, batch in enumerate(batches):
+                group.create_task(_run(index, batch))
+    except ExceptionGroup as errors:
+        auth_errors, other_errors = errors.split(AuthError)
+        if auth_errors is None:
+            raise
+        # A rejected key explains the run failing; still report what else went wrong
+        for error in other_errors.exceptions if other_errors is not None else ():
+            logger.error(f"Batch also failed: {error!r}", exc_info=error)
+        raise auth_errors.exceptions[0] from None
 
-            # Rate limiting delay
-            if i + batch_size < len(ads):
-                await asyncio.sleep(rate_limit_delay)
+    # Merge original ad data with enriched data in a single join
+    results = _join_enrichment(ads, pd.concat(enrichments)) if enrichments else ads.iloc[:0]
 
     # Log final statistics
     logger.info("=== Enrichment Complete ===")
     logger.info(f"Total sent: {stats.total_sent}")
     logger.info(f"Total success: {stats.total_success}")
     logger.info(f"Total failed: {stats.total_failed}")
+    logger.info(f"Unmatched results: {stats.unmatched_results}")
     logger.info(f"Success rate: {stats.success_rate():.1f}%")
     logger.info(f"Rate limit hits: {stats.rate_limit_hits}")
     logger.info(f"Timeout errors: {stats.timeout_errors}")
@@ -6,16 +6,33 @@ Extracts advertisements from saved HTML pages.
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from pathlib import Path
 from typing import TYPE_CHECKING
 
-from bs4 import BeautifulSoup
+import pandas as pd
+from lxml import etree
 
 if TYPE_CHECKING:
-    from pathlib import Path
+    from collections.abc import Iterator
 
+# XPath expressions compiled once and reused for every file and item
+_SUBTREE_ITEMS_XPATH = etree.XPath("descendant-or-self::*[@data-item-id]")
+_MARKERS_XPATH = etree.XPath(".//*[@data-marker]")
+_LINK_XPATH = etree.XPath(".//a")
 
-@dataclass
+# Characters of HTML decoded and fed to the parser at a time
+_READ_CHUNK_SIZE = 1024 * 1024
+
+# Below this much HTML in total, parsing in this process beats starting workers
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+
+
+@dataclass(slots=True, frozen=True)
 class Ad:
     """Represents a parsed advertisement."""
 
@@ -36,71 +53,177 @@ class Ad:
         }
 
 
+def _text(element: etree._Element) -> str:
+    """Concatenate the stripped text pieces of an element, skipping blanks."""
+    return "".join(piece.strip() for piece in element.itertext())
+
+
+def _markers(item: etree._Element) -> dict[str, etree._Element]:
+    """Map each data-marker value in an item to its first element, in one pass."""
+    markers: dict[str, etree._Element] = {}
+    for element in _MARKERS_XPATH(item):
+        markers.setdefault(element.get("data-marker"), element)
+    return markers
+
+
+def _parse_item(item: etree._Element) -> Ad | None:
+    """Build an Ad from one item element, or None if it has no id or title."""
+    ad_id = str(item.get("data-item-id", ""))
+    if not ad_id:
+        return None
+
+    markers = _markers(item)
+
+    # Extract title
+    title_elem = markers.get("item-title")
+    title = _text(title_elem) if title_elem is not None else ""
+    if not title:  # Only keep ads that have at least a title
+        return None
+
+    # Extract URL
+    url = ""
+    if title_elem.tag == "a":
+        url = str(title_elem.get("href", ""))
+    else:
+        links = _LINK_XPATH(title_elem)
+        if links:
+            url = str(links[0].get("href", ""))
+
+    # Extract location
+    location_elem = markers.get("item-location")
+    region = _text(location_elem) if location_elem is not None else ""
+
+    # Extract price
+    price_elem = markers.get("item-price")
+    price = _text(price_elem) if price_elem is not None else ""
+
+    return Ad(ad_id=ad_id, title=title, url=url, region=region, price=price)
+
+
+def _is_nested_item(element: etree._Element) -> bool:
+    """Whether an item element sits inside another item."""
+    return any(ancestor.get("data-item-id") is not None for ancestor in element.iterancestors())
+
+
+def _collect_ads(events: Iterator[tuple[str, etree._Element]], ads: list[Ad]) -> None:
+    """Append the ads of the items closed by the parser events, then discard them."""
+    for _event, element in events:
+        if element.get("data-item-id") is None:
+            continue
+        # Discarding a nested item would strip its outer item's content
+        if _is_nested_item(element):
+            continue
+
+        for item in _SUBTREE_ITEMS_XPATH(element):
+            ad = _parse_item(item)
+            if ad is not None:
+                ads.append(ad)
+
+        # Drop the parsed item and the items before it
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
 def parse_html_file(file_path: str | Path) -> list[Ad]:
     """
     Parse a single HTML file and extract ads.
 
+    The file is parsed as a stream: each item is read as soon as its closing
+    tag is seen and then discarded, so memory stays bounded by one item
+    rather than the whole page. Items nested in another item are kept until
+    the outer item closes and are then parsed with it, in document order.
+
     Args:
         file_path: Path to the HTML file.
 
     Returns:
         List of parsed Ad objects.
-    """
-    from pathlib import Path  # noqa: PLC0415
-
-    content = Path(file_path).read_text(encoding="utf-8")
-    soup = BeautifulSoup(content, "lxml")
-    items = soup.find_all(attrs={"data-item-id": True})
 
+    Raises:
+        UnicodeDecodeError: If the file is not valid UTF-8.
+    """
     ads: list[Ad] = []
-    for item in items:
-        ad_id = str(item.get("data-item-id", ""))
-        if not ad_id:
-            continue
-
-        # Extract title
-        title_elem = item.find(attrs={"data-marker": "item-title"})
-        title = title_elem.get_text(strip=True) if title_elem else ""
-
-        # Extract URL
-        url = ""
-        if title_elem and title_elem.name == "a":
-            url = str(title_elem.get("href", ""))
-        elif title_elem:
-            link_elem = title_elem.find("a")
-            if link_elem:
-                url = str(link_elem.get("href", ""))
+    parser = etree.HTMLPullParser(events=("end",))
+    # Decoding here, strictly, keeps invalid bytes from turning into U+FFFD
+    with Path(file_path).open(encoding="utf-8") as file:
+        chunk = file.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            # Empty document
+            return ads
+        while chunk:
+            parser.feed(chunk)
+            _collect_ads(parser.read_events(), ads)
+            chunk = file.read(_READ_CHUNK_SIZE)
+
+    parser.close()
+    _collect_ads(parser.read_events(), ads)
+    return ads
 
-        # Extract location
-        location_elem = item.find(attrs={"data-marker": "item-location"})
-        region = location_elem.get_text(strip=True) if location_elem else ""
 
-        # Extract price
-        price_elem = item.find(attrs={"data-marker": "item-price"})
-        price = price_elem.get_text(strip=True) if price_elem else ""
+def _parse_html_file_or_skip(file_path: str | Path) -> list[Ad]:
+    """Parse a single HTML file, returning no ads if it cannot be read."""
+    try:
+        return parse_html_file(file_path)
+    except (OSError, FileNotFoundError):
+        # Skip files that don't exist or can't be read
+        return []
 
-        if title:  # Only add if we have at least a title
-            ads.append(Ad(ad_id=ad_id, title=title, url=url, region=region, price=price))
 
-    return ads
+def _total_size(file_paths: list[str | Path]) -> int:
+    """Sum the sizes of the files, counting unreadable ones as empty."""
+    total = 0
+    for file_path in file_paths:
+        try:
+            total += Path(file_path).stat().st_size
+        except OSError:
+            continue
+    return total
 
 
 def parse_html_files(file_paths: list[str | Path]) -> list[Ad]:
     """
     Parse multiple HTML files and extract ads.
 
+    Files are independent, so with at least PARALLEL_MIN_BYTES of HTML they
+    are parsed in parallel worker processes, one per file up to the number
+    of CPUs. Smaller inputs are parsed in this process, since starting the
+    workers would cost more than it saves. Ads are returned in file order.
+
     Args:
         file_paths: List of paths to HTML files.
 
     Returns:
         List of parsed Ad objects.
     """
-    all_ads: list[Ad] = []
-    for file_path in file_paths:
-        try:
-            ads = parse_html_file(file_path)
-            all_ads.extend(ads)
-        except (OSError, FileNotFoundError):
-            # Skip files that don't exist or can't be read
-            continue
-    return all_ads
+    if len(file_paths) <= 1 or _total_size(file_paths) < PARALLEL_MIN_BYTES:
+        return list(itertools.chain.from_iterable(map(_parse_html_file_or_skip, file_paths)))
+
+    max_workers = min(len(file_paths), os.cpu_count() or 1)
+    # The caller may have threads running (e.g. the api_log() listener), and
+    # fork() would copy their locks into the workers. The forkserver starts
+    # workers from a clean process instead, at the cost of re-importing
+    # __main__ once in the server.
+    mp_context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+        results = executor.map(_parse_html_file_or_skip, file_paths)
+        return list(itertools.chain.from_iterable(results))
+
+
+def ads_to_df(ads: list[Ad]) -> pd.DataFrame:
+    """
+    Convert parsed ads to a DataFrame with one string column per Ad field.
+
+    Columns are built directly from the attributes, with no dict per ad and
+    no dtype inference.
+
+    Args:
+        ads: Parsed Ad objects.
+
+    Returns:
+        DataFrame with the Ad fields as columns, in declaration order.
+    """
+    return pd.DataFrame(
+        {field.name: [getattr(ad, field.name) for ad in ads] for field in fields(Ad)},
+        dtype="string",
+    )
@@ -8,7 +8,7 @@ import pandas as pd
 import pytest
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_html():
     """Sample HTML content with ad listings."""
     return """<!DOCTYPE html>
@@ -36,7 +36,7 @@ def sample_html_file(tmp_path, sample_html):
     return html_file
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_ads_df():
     """Sample DataFrame with parsed ads."""
     return pd.DataFrame(
@@ -59,7 +59,7 @@ def sample_ads_df():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_enriched_df():
     """Sample DataFrame with enriched ads."""
     return pd.DataFrame(
@@ -96,7 +96,7 @@ def sample_enriched_df():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_output_df():
     """Sample DataFrame with target catalog."""
     return pd.DataFrame(
@@ -138,7 +138,7 @@ def sample_output_df():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def api_success_response():
     """Sample successful API response."""
     return {
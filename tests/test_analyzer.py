@@ -8,22 +8,29 @@ from __future__ import annotations
 
 import pandas as pd
 
-from src.analyzer import find_missing_coverage, generate_coverage_report
+from src.analyzer import find_missing_coverage, generate_coverage_report, load_coverage_data
 
 
-class TestFindMissingCoverage:
-    """Test missing coverage detection."""
+class TestLoadCoverageData:
+    """Test loading of coverage inputs."""
 
-    def test_find_missing_combinations(self, sample_enriched_df, sample_output_df, tmp_csv_dir):
-        """Test finding missing group combinations."""
+    def test_reads_only_coverage_columns(self, sample_enriched_df, tmp_csv_dir):
+        """Test that unused CSV columns are skipped and NaN groups become empty."""
         enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-        missing_path = tmp_csv_dir / "missing.csv"
+        sample_enriched_df.assign(group2=[None, "!"]).to_csv(enriched_path, index=False)
+
+        df = load_coverage_data(enriched_path)
+
+        assert sorted(df.columns) == ["group0", "group1", "group2", "marka", "model"]
+        assert df["group2"].tolist() == ["", "!"]
 
-        sample_enriched_df.to_csv(enriched_path, index=False)
-        sample_output_df.to_csv(output_path, index=False)
 
-        result = find_missing_coverage(enriched_path, output_path, missing_path)
+class TestFindMissingCoverage:
+    """Test missing coverage detection."""
+
+    def test_find_missing_combinations(self, sample_enriched_df, sample_output_df):
+        """Test finding missing group combinations."""
+        result = find_missing_coverage(sample_enriched_df, sample_output_df)
 
         # Should have 2 missing combinations
         assert len(result) == 2
@@ -32,42 +39,32 @@ class TestFindMissingCoverage:
 
     def test_full_coverage(self, sample_enriched_df, tmp_csv_dir):
         """Test when all combinations are covered."""
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
         missing_path = tmp_csv_dir / "missing.csv"
 
         # Use same data for both
-        sample_enriched_df.to_csv(enriched_path, index=False)
-        sample_enriched_df.to_csv(output_path, index=False)
-
-        result = find_missing_coverage(enriched_path, output_path, missing_path)
+        result = find_missing_coverage(sample_enriched_df, sample_enriched_df, missing_path)
 
         # Should return empty DataFrame with correct columns
         assert len(result) == 0
         assert "group0" in result.columns
         assert "reason" in result.columns
+        # Empty result is still written so stale output is not left behind
+        assert missing_path.exists()
 
-    def test_missing_with_nan_groups(self, tmp_csv_dir):
+    def test_missing_with_nan_groups(self):
         """Test handling of NaN group values."""
         enriched_df = pd.DataFrame(
             [
-                {"group0": "test", "group1": "", "group2": ""},
+                {"group0": "test", "group1": None, "group2": ""},
             ]
         )
         output_df = pd.DataFrame(
             [
-                {"group0": "test", "group1": "missing", "group2": ""},
+                {"group0": "test", "group1": "missing", "group2": None},
             ]
         )
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-        missing_path = tmp_csv_dir / "missing.csv"
-
-        enriched_df.to_csv(enriched_path, index=False)
-        output_df.to_csv(output_path, index=False)
-
-        result = find_missing_coverage(enriched_path, output_path, missing_path)
+        result = find_missing_coverage(enriched_df, output_df)
 
         # Should find the missing combination
         assert len(result) >= 1
@@ -90,34 +87,47 @@ class TestFindMissingCoverage:
         assert "reason" in saved_df.columns
         assert all(saved_df["reason"] == "отсутствует")
 
-    def test_result_columns(self, sample_enriched_df, sample_output_df, tmp_csv_dir):
+    def test_result_columns(self, sample_enriched_df, sample_output_df):
         """Test that result has correct columns."""
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-        missing_path = tmp_csv_dir / "missing.csv"
-
-        sample_enriched_df.to_csv(enriched_path, index=False)
-        sample_output_df.to_csv(output_path, index=False)
-
-        result = find_missing_coverage(enriched_path, output_path, missing_path)
+        result = find_missing_coverage(sample_enriched_df, sample_output_df)
 
         expected_cols = ["group0", "group1", "group2", "marka", "model", "reason"]
         for col in expected_cols:
             assert col in result.columns
 
+    def test_sorted_by_catalog_frequency(self):
+        """Test that the most frequent missing combinations come first."""
+        enriched_df = pd.DataFrame([{"group0": "a", "group1": "a", "group2": "a"}])
+        output_df = pd.DataFrame(
+            [
+                {"group0": "b", "group1": "b", "group2": "b"},
+                {"group0": "c", "group1": "c", "group2": "c"},
+                {"group0": "c", "group1": "c", "group2": "c"},
+                {"group0": "a", "group1": "a", "group2": "a"},
+            ]
+        )
+
+        result = find_missing_coverage(enriched_df, output_df)
+
+        assert result["group0"].tolist() == ["c", "b"]
+
+    def test_does_not_modify_inputs(self, sample_enriched_df, sample_output_df):
+        """Test that the caller's DataFrames are left untouched."""
+        enriched_df = sample_enriched_df.copy()
+        enriched_df.loc[0, "group2"] = None
+
+        result = find_missing_coverage(enriched_df, sample_output_df)
+
+        assert len(result) == 3
+        assert pd.isna(enriched_df.loc[0, "group2"])
+
 
 class TestGenerateCoverageReport:
     """Test coverage report generation."""
 
-    def test_coverage_report_calculation(self, sample_enriched_df, sample_output_df, tmp_csv_dir):
+    def test_coverage_report_calculation(self, sample_enriched_df, sample_output_df):
         """Test coverage percentage calculation."""
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        sample_enriched_df.to_csv(enriched_path, index=False)
-        sample_output_df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(sample_enriched_df, sample_output_df)
 
         assert "total_combinations" in report
         assert "covered_combinations" in report
@@ -130,7 +140,7 @@ class TestGenerateCoverageReport:
         assert report["missing_combinations"] == 2
         assert report["coverage_percentage"] > 0
 
-    def test_full_coverage_report(self, tmp_csv_dir):
+    def test_full_coverage_report(self):
         """Test report with 100% coverage."""
         df = pd.DataFrame(
             [
@@ -139,18 +149,12 @@ class TestGenerateCoverageReport:
             ]
         )
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        df.to_csv(enriched_path, index=False)
-        df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(df, df)
 
         assert report["coverage_percentage"] == 100.0
         assert report["missing_combinations"] == 0
 
-    def test_zero_coverage_report(self, tmp_csv_dir):
+    def test_zero_coverage_report(self):
         """Test report with 0% coverage."""
         enriched_df = pd.DataFrame(
             [
@@ -163,32 +167,20 @@ class TestGenerateCoverageReport:
             ]
         )
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        enriched_df.to_csv(enriched_path, index=False)
-        output_df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(enriched_df, output_df)
 
         assert report["coverage_percentage"] == 0.0
 
-    def test_empty_catalogs(self, tmp_csv_dir):
+    def test_empty_catalogs(self):
         """Test report with empty catalogs."""
         enriched_df = pd.DataFrame(columns=["group0", "group1", "group2"])
         output_df = pd.DataFrame(columns=["group0", "group1", "group2"])
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        enriched_df.to_csv(enriched_path, index=False)
-        output_df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(enriched_df, output_df)
 
         assert report["coverage_percentage"] == 0
 
-    def test_duplicate_handling(self, tmp_csv_dir):
+    def test_duplicate_handling(self):
         """Test that duplicates are handled correctly."""
         # Enriched has duplicates
         enriched_df = pd.DataFrame(
@@ -206,13 +198,7 @@ class TestGenerateCoverageReport:
             ]
         )
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        enriched_df.to_csv(enriched_path, index=False)
-        output_df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(enriched_df, output_df)
 
         # Should count unique combinations only
         assert report["total_combinations"] == 2
@@ -223,7 +209,7 @@ class TestGenerateCoverageReport:
 class TestAnalyzerEdgeCases:
     """Test edge cases in analyzer."""
 
-    def test_special_characters_in_groups(self, tmp_csv_dir):
+    def test_special_characters_in_groups(self):
         """Test handling of special characters in group values."""
         df = pd.DataFrame(
             [
@@ -231,17 +217,11 @@ class TestAnalyzerEdgeCases:
             ]
         )
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        df.to_csv(enriched_path, index=False)
-        df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(df, df)
 
         assert report["coverage_percentage"] == 100.0
 
-    def test_very_long_group_values(self, tmp_csv_dir):
+    def test_very_long_group_values(self):
         """Test handling of very long group names."""
         long_name = "a" * 1000
         df = pd.DataFrame(
@@ -250,12 +230,6 @@ class TestAnalyzerEdgeCases:
             ]
         )
 
-        enriched_path = tmp_csv_dir / "enriched.csv"
-        output_path = tmp_csv_dir / "output.csv"
-
-        df.to_csv(enriched_path, index=False)
-        df.to_csv(output_path, index=False)
-
-        report = generate_coverage_report(enriched_path, output_path)
+        report = generate_coverage_report(df, df)
 
         assert report["coverage_percentage"] == 100.0
@@ -7,21 +7,75 @@ Using mocks to avoid actual API calls.
 
 from __future__ import annotations
 
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any
 from unittest.mock import AsyncMock, Mock, patch
 
 import httpx
+import orjson
+import pandas as pd
 import pytest
 
 from src.enricher import (
+    API_TIMEOUT,
+    RATE_LIMIT_MIN_FACTOR,
+    RATE_LIMIT_WINDOW,
     APIError,
     AuthError,
     EnrichmentStats,
+    RateLimiter,
     RateLimitError,
+    api_log,
     enrich_all_ads,
     enrich_batch,
 )
 
 
+def _response(
+    status: int,
+    body: Any = None,
+    headers: dict[str, str] | None = None,
+) -> Mock:
+    """Build a mocked httpx.Response; ``body`` is JSON-encoded unless it is bytes."""
+    response = Mock(spec=httpx.Response)
+    response.status_code = status
+    response.headers = httpx.Headers(headers)
+    response.content = body if isinstance(body, bytes) else orjson.dumps(body)
+    return response
+
+
+def _client(post: Any) -> Mock:
+    """Build a mocked httpx.AsyncClient that is its own ``async with`` target."""
+    client = Mock(spec=httpx.AsyncClient)
+    client.post = post
+    client.__aenter__ = AsyncMock(return_value=client)
+    client.__aexit__ = AsyncMock(return_value=False)
+    return client
+
+
+class TestApiLog:
+    """Test the API log file context."""
+
+    def test_records_written_and_file_closed(self, tmp_path):
+        """Test that records reach the file and nothing stays attached or open."""
+        log_path = tmp_path / "logs" / "api.log"
+        root = logging.getLogger()
+        handlers = list(root.handlers)
+
+        close = patch.object(
+            logging.FileHandler, "close", autospec=True, side_effect=logging.FileHandler.close
+        )
+        with close as close_mock, api_log(log_path):
+            logging.getLogger("src.enricher").warning("batch failed")
+
+        assert root.handlers == handlers
+        close_mock.assert_called_once()
+        assert "WARNING - batch failed" in log_path.read_text(encoding="utf-8")
+
+
 class TestEnrichmentStats:
     """Test EnrichmentStats dataclass."""
 
@@ -43,6 +97,80 @@ class TestEnrichmentStats:
         stats = EnrichmentStats()
         assert stats.success_rate() == 0.0
 
+    def test_unknown_counter_rejected(self):
+        """Test that a misspelled counter fails instead of adding an attribute."""
+        stats = EnrichmentStats()
+        with pytest.raises(AttributeError):
+            stats.retries = 1
+
+
+class TestRateLimiter:
+    """Test token bucket rate limiter."""
+
+    @pytest.mark.asyncio
+    async def test_spaces_out_requests(self):
+        """Test that acquisitions beyond the burst wait for tokens."""
+        limiter = RateLimiter(rate=50)
+
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+
+        # First token is available immediately, the next two take 1/50s each
+        assert time.monotonic() - start >= 0.035
+
+    @pytest.mark.asyncio
+    async def test_zero_rate_is_unlimited(self):
+        """Test that a zero rate never waits."""
+        limiter = RateLimiter(rate=0)
+
+        start = time.monotonic()
+        for _ in range(100):
+            await limiter.acquire()
+
+        assert time.monotonic() - start < 0.05
+
+    def test_slow_down_has_a_floor(self):
+        """Test that repeated slowdowns stop at the minimum rate."""
+        limiter = RateLimiter(rate=2)
+
+        # Each call lands in a new quota window
+        clock = itertools.count(start=RATE_LIMIT_WINDOW, step=RATE_LIMIT_WINDOW)
+        with patch("src.enricher.time.monotonic", side_effect=clock):
+            for _ in range(16):
+                limiter.slow_down()
+
+        assert limiter.rate == 2 * RATE_LIMIT_MIN_FACTOR
+
+    def test_slow_down_once_per_window(self):
+        """Test that a wave of low-quota responses halves the rate only once."""
+        limiter = RateLimiter(rate=2)
+        low_quota = _response(200, headers={"X-RateLimit-Remaining": "0"})
+
+        for _ in range(16):
+            limiter.observe(low_quota)
+
+        assert limiter.rate == 1
+
+    def test_rate_restored_when_quota_recovers(self):
+        """Test that a healthy quota brings back the configured rate."""
+        limiter = RateLimiter(rate=2)
+        limiter.observe(_response(200, headers={"X-RateLimit-Remaining": "1"}))
+        limiter.observe(_response(200, headers={"X-RateLimit-Remaining": "50"}))
+
+        assert limiter.rate == 2
+
+    @pytest.mark.asyncio
+    async def test_pause_blocks_acquire(self):
+        """Test that pause delays the next acquisition."""
+        limiter = RateLimiter(rate=0)
+        limiter.pause(0.05)
+
+        start = time.monotonic()
+        await limiter.acquire()
+
+        assert time.monotonic() - start >= 0.04
+
 
 class TestEnrichBatch:
     """Test batch enrichment."""
@@ -50,12 +178,9 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_successful_enrichment(self, api_success_response):
         """Test successful API enrichment."""
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 200
-        mock_response.json.return_value = api_success_response
+        mock_response = _response(200, api_success_response)
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         stats = EnrichmentStats()
         titles = ["Test Title"]
@@ -69,12 +194,10 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_auth_error(self):
         """Test authentication error handling."""
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 401
+        mock_response = _response(401)
         mock_response.text = "Unauthorized"
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         stats = EnrichmentStats()
 
@@ -84,15 +207,11 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_rate_limit_retry(self):
         """Test rate limit with retry."""
-        mock_response_429 = Mock(spec=httpx.Response)
-        mock_response_429.status_code = 429
+        mock_response_429 = _response(429)
 
-        mock_response_200 = Mock(spec=httpx.Response)
-        mock_response_200.status_code = 200
-        mock_response_200.json.return_value = {"processed_data": []}
+        mock_response_200 = _response(200, {"processed_data": []})
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(side_effect=[mock_response_429, mock_response_200])
+        mock_client = _client(AsyncMock(side_effect=[mock_response_429, mock_response_200]))
 
         stats = EnrichmentStats()
         _ = await enrich_batch(["Test"], mock_client, stats, retry=2)
@@ -100,29 +219,59 @@ class TestEnrichBatch:
         assert stats.rate_limit_hits == 1
         assert stats.retry_count == 1
 
+    @pytest.mark.asyncio
+    async def test_rate_limit_retry_after_header(self):
+        """Test that Retry-After overrides exponential backoff."""
+        mock_response_429 = _response(429, headers={"Retry-After": "0.01"})
+
+        mock_response_200 = _response(200, {"processed_data": []})
+
+        mock_client = _client(AsyncMock(side_effect=[mock_response_429, mock_response_200]))
+
+        stats = EnrichmentStats()
+        start = time.monotonic()
+        _ = await enrich_batch(["Test"], mock_client, stats, retry=2)
+
+        assert stats.rate_limit_hits == 1
+        assert time.monotonic() - start < 1
+
+    @pytest.mark.asyncio
+    async def test_low_remaining_quota_slows_limiter(self):
+        """Test that a nearly exhausted quota halves the limiter rate."""
+        mock_response = _response(
+            200, {"processed_data": []}, headers={"X-RateLimit-Remaining": "1"}
+        )
+
+        mock_client = _client(AsyncMock(return_value=mock_response))
+
+        limiter = RateLimiter(rate=4)
+        await enrich_batch(["Test"], mock_client, EnrichmentStats(), limiter=limiter)
+
+        assert limiter.rate == 2
+
     @pytest.mark.asyncio
     async def test_server_error_retry(self):
         """Test server error with retry."""
-        mock_response_500 = Mock(spec=httpx.Response)
-        mock_response_500.status_code = 500
+        mock_response_500 = _response(500)
 
-        mock_response_200 = Mock(spec=httpx.Response)
-        mock_response_200.status_code = 200
-        mock_response_200.json.return_value = {"processed_data": []}
+        mock_response_200 = _response(200, {"processed_data": []})
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(side_effect=[mock_response_500, mock_response_200])
+        mock_client = _client(AsyncMock(side_effect=[mock_response_500, mock_response_200]))
 
         stats = EnrichmentStats()
         await enrich_batch(["Test"], mock_client, stats, retry=2)
 
         assert stats.retry_count == 1
+        # The body is serialized once and resent as-is on retry
+        first, second = (call.kwargs for call in mock_client.post.call_args_list)
+        assert first["content"] is second["content"]
+        assert first["headers"]["Content-Type"] == "application/json"
+        assert orjson.loads(first["content"])["data"][0]["title"] == "Test"
 
     @pytest.mark.asyncio
     async def test_timeout_error(self):
         """Test timeout error handling."""
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(side_effect=httpx.TimeoutException("Timeout"))
+        mock_client = _client(AsyncMock(side_effect=httpx.TimeoutException("Timeout")))
 
         stats = EnrichmentStats()
         result = await enrich_batch(["Test"], mock_client, stats, retry=1)
@@ -133,12 +282,9 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_invalid_json_response(self):
         """Test handling of non-JSON response."""
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 200
-        mock_response.json.side_effect = ValueError("Invalid JSON")
+        mock_response = _response(200, b"not json")
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         stats = EnrichmentStats()
         result = await enrich_batch(["Test"], mock_client, stats)
@@ -149,12 +295,9 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_empty_processed_data(self):
         """Test handling of empty processed_data."""
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"processed_data": []}
+        mock_response = _response(200, {"processed_data": []})
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         stats = EnrichmentStats()
         result = await enrich_batch(["Test"], mock_client, stats)
@@ -164,11 +307,9 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_exhausted_retries(self):
         """Test behavior when all retries are exhausted."""
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 500
+        mock_response = _response(500)
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         stats = EnrichmentStats()
         result = await enrich_batch(["Test"], mock_client, stats, retry=3)
@@ -179,12 +320,10 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_unexpected_status_code(self):
         """Test handling of unexpected status code (lines 141-144)."""
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 418  # I'm a teapot
+        mock_response = _response(418)  # I'm a teapot
         mock_response.text = "Unexpected error"
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         stats = EnrichmentStats()
         result = await enrich_batch(["Test"], mock_client, stats)
@@ -195,8 +334,7 @@ class TestEnrichBatch:
     @pytest.mark.asyncio
     async def test_timeout_exhausted_retries(self):
         """Test timeout with all retries exhausted (lines 153-160)."""
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(side_effect=httpx.TimeoutException("Timeout"))
+        mock_client = _client(AsyncMock(side_effect=httpx.TimeoutException("Timeout")))
 
         stats = EnrichmentStats()
         result = await enrich_batch(["Test"], mock_client, stats, retry=1)
@@ -223,27 +361,20 @@ class TestEnrichAllAds:
             ]
         }
 
-        mock_response = Mock(spec=httpx.Response)
-        mock_response.status_code = 200
-        mock_response.json.return_value = api_response
+        mock_response = _response(200, api_response)
 
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = AsyncMock(return_value=mock_response)
-        mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client.__aexit__ = AsyncMock()
+        mock_client = _client(AsyncMock(return_value=mock_response))
 
         with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
-            ads_list = sample_ads_df.to_dict("records")
-
             result, stats = await enrich_all_ads(
-                ads_list,
+                sample_ads_df,
                 batch_size=2,
                 rate_limit_delay=0.0,
             )
 
             # Only the enriched item is returned
             assert len(result) == 1
-            assert result[0]["marka"] == "jcb"
+            assert result.iloc[0]["marka"] == "jcb"
             assert stats.total_sent == 2
             assert stats.total_success == 1
 
@@ -252,10 +383,10 @@ class TestEnrichAllAds:
         """Test that ads are split into correct batch sizes."""
 
         # Create API response that returns all items
-        def create_response(count):
+        def create_response(titles):
             return {
                 "processed_data": [
-                    {"title": f"Item {i}", "marka": "test", "group0": "test"} for i in range(count)
+                    {"raw_item": title, "marka": "test", "group0": "test"} for title in titles
                 ]
             }
 
@@ -264,24 +395,17 @@ class TestEnrichAllAds:
         async def mock_post(*args, **kwargs):
             nonlocal call_count
             call_count += 1
-            # First call: 200 items, second call: 50 items
-            count = 200 if call_count == 1 else 50
-            mock_response = Mock(spec=httpx.Response)
-            mock_response.status_code = 200
-            mock_response.json.return_value = create_response(count)
-            return mock_response
-
-        mock_client = Mock(spec=httpx.AsyncClient)
-        mock_client.post = mock_post
-        mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client.__aexit__ = AsyncMock()
+            titles = [item["title"] for item in orjson.loads(kwargs["content"])["data"]]
+            return _response(200, create_response(titles))
+
+        mock_client = _client(mock_post)
 
         with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
             # Create 250 ads (more than batch size of 200)
-            ads_list = [{"title": f"Ad {i}"} for i in range(250)]
+            ads_df = pd.DataFrame({"title": [f"Ad {i}" for i in range(250)]})
 
             result, stats = await enrich_all_ads(
-                ads_list,
+                ads_df,
                 batch_size=200,
                 rate_limit_delay=0.0,
             )
@@ -291,6 +415,254 @@ class TestEnrichAllAds:
             assert stats.total_sent == 250
             assert len(result) == 250
 
+    @pytest.mark.asyncio
+    async def test_duplicate_titles_sent_once(self):
+        """Test that repeated titles are enriched once and fanned out."""
+        sent_titles = []
+
+        async def mock_post(*args, **kwargs):
+            titles = [item["title"] for item in orjson.loads(kwargs["content"])["data"]]
+            sent_titles.extend(titles)
+            return _response(
+                200, {"processed_data": [{"raw_item": t, "marka": t.split()[0]} for t in titles]}
+            )
+
+        mock_client = _client(mock_post)
+
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame(
+                {
+                    "ad_id": ["1", "2", "3"],
+                    "title": ["jcb редуктор", "cat натяжитель", "jcb редуктор"],
+                }
+            )
+
+            result, stats = await enrich_all_ads(ads_df, rate_limit_delay=0.0)
+
+            assert sent_titles == ["jcb редуктор", "cat натяжитель"]
+            assert stats.total_sent == 2
+            assert result["ad_id"].tolist() == ["1", "2", "3"]
+            assert result["marka"].tolist() == ["jcb", "cat", "jcb"]
+
+    @pytest.mark.asyncio
+    async def test_results_matched_by_raw_item(self):
+        """Test that out-of-order and partial results pair with the right ads."""
+        mock_response = _response(
+            200,
+            {
+                "processed_data": [
+                    {"raw_item": "C", "marka": "hyundai"},
+                    {"raw_item": "A", "marka": "jcb"},
+                    {"raw_item": "A", "marka": "duplicate"},
+                    {"raw_item": "unknown", "marka": "cat"},
+                ]
+            },
+        )
+
+        mock_client = _client(AsyncMock(return_value=mock_response))
+
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"ad_id": ["1", "2", "3"], "title": ["A", "B", "C"]})
+
+            result, stats = await enrich_all_ads(ads_df, rate_limit_delay=0.0)
+
+            assert result["ad_id"].tolist() == ["1", "3"]
+            assert result["marka"].tolist() == ["jcb", "hyundai"]
+            # Only matched results count as successes
+            assert stats.total_success == 2
+            assert stats.unmatched_results == 2
+
+    @pytest.mark.asyncio
+    async def test_on_batch_streams_results(self):
+        """Test that on_batch receives enriched ads instead of the result."""
+
+        async def mock_post(*args, **kwargs):
+            title = orjson.loads(kwargs["content"])["data"][0]["title"]
+            return _response(200, {"processed_data": [{"raw_item": title, "marka": "jcb"}]})
+
+        mock_client = _client(mock_post)
+
+        streamed = []
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"title": ["A", "B", "A"]})
+
+            result, _stats = await enrich_all_ads(
+                ads_df,
+                batch_size=1,
+                rate_limit_delay=0.0,
+                on_batch=streamed.append,
+            )
+
+            assert result.empty
+            assert sorted(len(batch) for batch in streamed) == [1, 2]
+            assert all((batch["marka"] == "jcb").all() for batch in streamed)
+
+    @pytest.mark.asyncio
+    async def test_one_date_per_run(self):
+        """Test that every batch of a run sends the date taken at its start."""
+        days = set()
+
+        async def mock_post(*args, **kwargs):
+            days.update(item["day"] for item in orjson.loads(kwargs["content"])["data"])
+            return _response(200, {"processed_data": []})
+
+        mock_client = _client(mock_post)
+
+        today = Mock(side_effect=["2026-01-22", "2026-01-23"])
+        with (
+            patch("src.enricher.httpx.AsyncClient", return_value=mock_client),
+            patch("src.enricher._get_today_date", today),
+        ):
+            ads_df = pd.DataFrame({"title": ["A", "B", "C"]})
+
+            await enrich_all_ads(ads_df, batch_size=1, rate_limit_delay=0.0)
+
+            assert days == {"2026-01-22"}
+            today.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_on_batch_keeps_ad_order(self):
+        """Test that streamed ads keep their original order within a batch."""
+        mock_response = _response(
+            200,
+            {
+                "processed_data": [
+                    {"raw_item": "A", "marka": "jcb"},
+                    {"raw_item": "B", "marka": "cat"},
+                ]
+            },
+        )
+
+        mock_client = _client(AsyncMock(return_value=mock_response))
+
+        streamed = []
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"ad_id": ["1", "2", "3", "4"], "title": ["B", "A", "B", "A"]})
+
+            await enrich_all_ads(ads_df, rate_limit_delay=0.0, on_batch=streamed.append)
+
+            assert len(streamed) == 1
+            assert streamed[0]["ad_id"].tolist() == ["1", "2", "3", "4"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(("concurrency", "expected_max"), [(16, 6), (2, 2)])
+    async def test_batches_run_concurrently(self, concurrency, expected_max):
+        """Test that batches overlap, up to `concurrency` in flight at once."""
+        in_flight = 0
+        max_in_flight = 0
+
+        async def mock_post(*args, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            title = orjson.loads(kwargs["content"])["data"][0]["title"]
+            return _response(200, {"processed_data": [{"raw_item": title, "marka": "test"}]})
+
+        mock_client = _client(mock_post)
+
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"title": [f"Ad {i}" for i in range(6)]})
+
+            result, _stats = await enrich_all_ads(
+                ads_df,
+                batch_size=1,
+                rate_limit_delay=0.0,
+                concurrency=concurrency,
+            )
+
+            assert max_in_flight == expected_max
+            assert result["title"].tolist() == ads_df["title"].tolist()
+
+    @pytest.mark.asyncio
+    async def test_client_uses_http2_pool(self, sample_ads_df):
+        """Test that one HTTP/2 client with a bounded keep-alive pool is created."""
+        mock_client = _client(AsyncMock())
+
+        with (
+            patch("src.enricher.httpx.AsyncClient", return_value=mock_client) as client_cls,
+            patch("src.enricher.enrich_batch", AsyncMock(return_value=[])),
+        ):
+            await enrich_all_ads(sample_ads_df, rate_limit_delay=0.0, concurrency=4)
+
+        client_cls.assert_called_once()
+        kwargs = client_cls.call_args.kwargs
+        assert kwargs["http2"] is True
+        assert kwargs["limits"].max_connections == 4
+        assert kwargs["limits"].max_keepalive_connections == 4
+        assert kwargs["timeout"] == API_TIMEOUT
+
+    @pytest.mark.asyncio
+    async def test_auth_error_cancels_remaining_batches(self):
+        """Test that a 401 on one batch stops the batches after it."""
+        call_count = 0
+
+        async def mock_post(*args, **kwargs):
+            nonlocal call_count
+            call_count += 1
+            return _response(401 if call_count == 2 else 200, {"processed_data": []})
+
+        mock_client = _client(mock_post)
+
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"title": [f"Ad {i}" for i in range(5)]})
+
+            with pytest.raises(AuthError):
+                await enrich_all_ads(ads_df, batch_size=1, rate_limit_delay=0.05)
+
+            # Give any batches that were not cancelled time to send
+            await asyncio.sleep(0.3)
+
+            assert call_count < 5
+
+    @pytest.mark.asyncio
+    async def test_auth_error_logs_other_failures(self, caplog):
+        """Test that errors raised alongside an AuthError are logged, not lost."""
+
+        # Neither request suspends, so both batches fail before either is cancelled
+        async def mock_post(*args, **kwargs):
+            title = orjson.loads(kwargs["content"])["data"][0]["title"]
+            if title == "B":
+                return _response(401)
+            return _response(200, {"processed_data": [{"raw_item": title, "marka": "jcb"}]})
+
+        def write_batch(batch_df):
+            raise OSError("No space left on device")
+
+        mock_client = _client(mock_post)
+
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"title": ["A", "B"]})
+
+            with pytest.raises(AuthError):
+                await enrich_all_ads(
+                    ads_df, batch_size=1, rate_limit_delay=0.0, on_batch=write_batch
+                )
+
+        assert "No space left on device" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_other_failures_raised_as_group(self):
+        """Test that failures other than AuthError propagate as an ExceptionGroup."""
+
+        async def mock_post(*args, **kwargs):
+            title = orjson.loads(kwargs["content"])["data"][0]["title"]
+            return _response(200, {"processed_data": [{"raw_item": title, "marka": "jcb"}]})
+
+        def write_batch(batch_df):
+            raise OSError("No space left on device")
+
+        mock_client = _client(mock_post)
+
+        with patch("src.enricher.httpx.AsyncClient", return_value=mock_client):
+            ads_df = pd.DataFrame({"title": ["A"]})
+
+            with pytest.raises(ExceptionGroup) as errors:
+                await enrich_all_ads(ads_df, rate_limit_delay=0.0, on_batch=write_batch)
+
+        assert errors.group_contains(OSError)
+
 
 class TestAPIErrors:
     """Test custom API exceptions."""
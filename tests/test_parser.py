@@ -6,7 +6,113 @@ Following SRP: focused testing of parsing logic only.
 
 from __future__ import annotations
 
-from src.parser import Ad, parse_html_file, parse_html_files
+import pickle
+from dataclasses import FrozenInstanceError
+from unittest.mock import patch
+
+import pytest
+
+from src.parser import Ad, ads_to_df, parse_html_file, parse_html_files
+
+# HTML documents shared by the parsing tests, built once at import
+_HTML_MINIMAL = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="111">
+        <a data-marker="item-title" href="/item/111">Minimal Ad</a>
+    </div>
+</body>
+</html>"""
+
+_HTML_NO_ITEMS = """<!DOCTYPE html>
+<html>
+<body>
+    <p>No ads here</p>
+</body>
+</html>"""
+
+_HTML_SEPARATE_CONTAINERS = """<!DOCTYPE html>
+<html>
+<body>
+    <section>
+        <div data-item-id="1"><a data-marker="item-title" href="/item/1">First</a></div>
+        <div data-item-id="2"><a data-marker="item-title" href="/item/2">Second</a></div>
+    </section>
+    <section>
+        <div data-item-id="3"><a data-marker="item-title" href="/item/3">Third</a></div>
+    </section>
+</body>
+</html>"""
+
+_HTML_NESTED_ITEMS = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="1">
+        <a data-marker="item-title" href="/item/1">Outer</a>
+        <div data-item-id="2"><a data-marker="item-title" href="/item/2">Inner</a></div>
+        <span data-marker="item-price">100₽</span>
+    </div>
+    <div data-item-id="3"><a data-marker="item-title" href="/item/3">Next</a></div>
+</body>
+</html>"""
+
+_HTML_NESTED_LINK = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="222">
+        <div data-marker="item-title">
+            <a href="/item/222">Nested Link Title</a>
+        </div>
+    </div>
+</body>
+</html>"""
+
+_HTML_WITHOUT_ID = """<!DOCTYPE html>
+<html>
+<body>
+    <div>
+        <a data-marker="item-title" href="/item/no-id">No ID Ad</a>
+    </div>
+</body>
+</html>"""
+
+_HTML_EMPTY_ID = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="">
+        <a data-marker="item-title" href="/item/empty">Empty ID Ad</a>
+    </div>
+</body>
+</html>"""
+
+_HTML_WITHOUT_TITLE = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="333">
+        <span data-marker="item-location">Location without title</span>
+    </div>
+</body>
+</html>"""
+
+_HTML_UNICODE = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="777">
+        <a data-marker="item-title" href="/item/777">Запчасти редуктор 液压</a>
+        <span data-marker="item-location">Москва́</span>
+    </div>
+</body>
+</html>"""
+
+_HTML_LARGE_PRICE = """<!DOCTYPE html>
+<html>
+<body>
+    <div data-item-id="999">
+        <a data-marker="item-title" href="/item/999">Expensive Item</a>
+        <p data-marker="item-price">1 500 000₽</p>
+    </div>
+</body>
+</html>"""
 
 
 class TestAd:
@@ -31,6 +137,20 @@ class TestAd:
             "price": "10 000₽",
         }
 
+    def test_ad_is_immutable_and_slotted(self):
+        """Test that Ad instances carry no __dict__ and reject assignment."""
+        ad = Ad(ad_id="123", title="Test Ad")
+
+        assert not hasattr(ad, "__dict__")
+        with pytest.raises(FrozenInstanceError):
+            ad.title = "Changed"
+
+    def test_ad_survives_pickling(self):
+        """Test that Ad can cross the worker-process boundary."""
+        ad = Ad(ad_id="123", title="Test Ad", price="10 000₽")
+
+        assert pickle.loads(pickle.dumps(ad)) == ad
+
 
 class TestParseHtmlFile:
     """Test single HTML file parsing."""
@@ -48,16 +168,8 @@ class TestParseHtmlFile:
 
     def test_parse_html_missing_optional_fields(self, tmp_path):
         """Test parsing HTML with missing optional fields."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div data-item-id="111">
-        <a data-marker="item-title" href="/item/111">Minimal Ad</a>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "minimal.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_MINIMAL, encoding="utf-8")
 
         ads = parse_html_file(html_file)
 
@@ -70,32 +182,62 @@ class TestParseHtmlFile:
 
     def test_parse_html_no_items(self, tmp_path):
         """Test parsing HTML without ad items."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <p>No ads here</p>
-</body>
-</html>"""
         html_file = tmp_path / "empty.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_NO_ITEMS, encoding="utf-8")
 
         ads = parse_html_file(html_file)
         assert ads == []
 
+    def test_parse_empty_file(self, tmp_path):
+        """Test that an empty file gives no ads."""
+        html_file = tmp_path / "empty.html"
+        html_file.write_bytes(b"")
+
+        assert parse_html_file(html_file) == []
+
+    def test_non_utf8_file_rejected(self, tmp_path):
+        """Test that a non-UTF-8 page fails instead of yielding garbled titles."""
+        html_file = tmp_path / "cp1251.html"
+        html_file.write_bytes(_HTML_MINIMAL.replace("Minimal Ad", "Объявление").encode("cp1251"))
+
+        with pytest.raises(UnicodeDecodeError):
+            parse_html_file(html_file)
+
+    def test_parse_in_small_chunks(self, tmp_path):
+        """Test that items split across read chunks are parsed whole."""
+        html_file = tmp_path / "containers.html"
+        html_file.write_text(_HTML_SEPARATE_CONTAINERS, encoding="utf-8")
+
+        with patch("src.parser._READ_CHUNK_SIZE", 7):
+            ads = parse_html_file(html_file)
+
+        assert [ad.title for ad in ads] == ["First", "Second", "Third"]
+
+    def test_parse_items_in_separate_containers(self, tmp_path):
+        """Test that discarding parsed items keeps items in later containers."""
+        html_file = tmp_path / "containers.html"
+        html_file.write_text(_HTML_SEPARATE_CONTAINERS, encoding="utf-8")
+
+        ads = parse_html_file(html_file)
+
+        assert [ad.ad_id for ad in ads] == ["1", "2", "3"]
+        assert [ad.title for ad in ads] == ["First", "Second", "Third"]
+
+    def test_parse_nested_items(self, tmp_path):
+        """Test that an item nested in another keeps the outer item intact."""
+        html_file = tmp_path / "nested_items.html"
+        html_file.write_text(_HTML_NESTED_ITEMS, encoding="utf-8")
+
+        ads = parse_html_file(html_file)
+
+        assert [ad.ad_id for ad in ads] == ["1", "2", "3"]
+        assert [ad.title for ad in ads] == ["Outer", "Inner", "Next"]
+        assert ads[0].price == "100₽"
+
     def test_parse_html_nested_link(self, tmp_path):
         """Test parsing when title element contains nested link."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div data-item-id="222">
-        <div data-marker="item-title">
-            <a href="/item/222">Nested Link Title</a>
-        </div>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "nested.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_NESTED_LINK, encoding="utf-8")
 
         ads = parse_html_file(html_file)
 
@@ -105,48 +247,24 @@ class TestParseHtmlFile:
 
     def test_parse_html_without_id_skipped(self, tmp_path):
         """Test that items without data-item-id are skipped."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div>
-        <a data-marker="item-title" href="/item/no-id">No ID Ad</a>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "no-id.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_WITHOUT_ID, encoding="utf-8")
 
         ads = parse_html_file(html_file)
         assert ads == []
 
     def test_parse_html_with_empty_id_skipped(self, tmp_path):
         """Test that items with empty data-item-id are skipped (line 56)."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div data-item-id="">
-        <a data-marker="item-title" href="/item/empty">Empty ID Ad</a>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "empty-id.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_EMPTY_ID, encoding="utf-8")
 
         ads = parse_html_file(html_file)
         assert ads == []
 
     def test_parse_html_without_title_skipped(self, tmp_path):
         """Test that items without title are skipped."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div data-item-id="333">
-        <span data-marker="item-location">Location without title</span>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "no-title.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_WITHOUT_TITLE, encoding="utf-8")
 
         ads = parse_html_file(html_file)
         assert ads == []
@@ -171,6 +289,43 @@ class TestParseHtmlFiles:
         ads = parse_html_files([])
         assert ads == []
 
+    def test_single_file_parsed_in_process(self, tmp_path, sample_html):
+        """Test that a single file does not start a worker pool."""
+        html_file = tmp_path / "single.html"
+        html_file.write_text(sample_html)
+
+        with patch("src.parser.ProcessPoolExecutor") as pool:
+            ads = parse_html_files([html_file])
+
+        assert len(ads) == 2
+        pool.assert_not_called()
+
+    def test_small_files_parsed_in_process(self, tmp_path, sample_html):
+        """Test that files below the size threshold do not start a worker pool."""
+        file1 = tmp_path / "file1.html"
+        file2 = tmp_path / "file2.html"
+        file1.write_text(sample_html)
+        file2.write_text(sample_html)
+
+        with patch("src.parser.ProcessPoolExecutor") as pool:
+            ads = parse_html_files([file1, file2])
+
+        assert len(ads) == 4
+        pool.assert_not_called()
+
+    def test_large_input_parsed_in_workers(self, tmp_path, sample_html):
+        """Test that input above the size threshold is parsed by a worker pool."""
+        file1 = tmp_path / "file1.html"
+        file2 = tmp_path / "file2.html"
+        file1.write_text(sample_html)
+        file2.write_text(sample_html.replace('data-item-id="', 'data-item-id="2'))
+
+        with patch("src.parser.PARALLEL_MIN_BYTES", 0):
+            ads = parse_html_files([file1, file2])
+
+        assert len(ads) == 4
+        assert [ad.ad_id for ad in ads[2:]] == ["2" + ad.ad_id for ad in ads[:2]]
+
     def test_parse_mixed_valid_invalid(self, tmp_path, sample_html):
         """Test parsing mix of valid and invalid files."""
         valid_file = tmp_path / "valid.html"
@@ -181,22 +336,38 @@ class TestParseHtmlFiles:
         assert len(ads) == 2  # Only from valid file
 
 
+class TestAdsToDf:
+    """Test conversion of parsed ads to a DataFrame."""
+
+    def test_columns_follow_ad_fields(self):
+        """Test one string column per Ad field, one row per ad."""
+        ads = [
+            Ad(ad_id="1", title="First", price="100₽"),
+            Ad(ad_id="2", title="Second", region="Москва"),
+        ]
+
+        df = ads_to_df(ads)
+
+        assert df.columns.tolist() == ["ad_id", "title", "url", "region", "price"]
+        assert all(dtype == "string" for dtype in df.dtypes)
+        assert df["title"].tolist() == ["First", "Second"]
+        assert df["region"].tolist() == ["", "Москва"]
+
+    def test_empty_list(self):
+        """Test that no ads give an empty frame with the Ad columns."""
+        df = ads_to_df([])
+
+        assert df.empty
+        assert df.columns.tolist() == ["ad_id", "title", "url", "region", "price"]
+
+
 class TestParserEdgeCases:
     """Test edge cases and error handling."""
 
     def test_parse_unicode_characters(self, tmp_path):
         """Test parsing HTML with unicode characters."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div data-item-id="777">
-        <a data-marker="item-title" href="/item/777">Запчасти редуктор 液压</a>
-        <span data-marker="item-location">Москва́</span>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "unicode.html"
-        html_file.write_text(html, encoding="utf-8")
+        html_file.write_text(_HTML_UNICODE, encoding="utf-8")
 
         ads = parse_html_file(html_file)
 
@@ -205,17 +376,8 @@ class TestParserEdgeCases:
 
     def test_parse_large_price_value(self, tmp_path):
         """Test parsing large price values."""
-        html = """<!DOCTYPE html>
-<html>
-<body>
-    <div data-item-id="999">
-        <a data-marker="item-title" href="/item/999">Expensive Item</a>
-        <p data-marker="item-price">1 500 000₽</p>
-    </div>
-</body>
-</html>"""
         html_file = tmp_path / "price.html"
-        html_file.write_text(html)
+        html_file.write_text(_HTML_LARGE_PRICE, encoding="utf-8")
 
         ads = parse_html_file(html_file)
 